@@ -34,24 +34,59 @@ Usage:
 """
 
 import argparse
+import codecs
+import io
+import mmap
+import os
 import re
-import shutil
-import xml.etree.ElementTree as ET
+import sys
+import time
+from collections import Counter
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, redirect_stdout
 from dataclasses import dataclass, field
-from typing import List, Optional, Dict, Tuple
-from datetime import datetime
+from functools import lru_cache
+from typing import List, Optional, Dict, Tuple, FrozenSet
 import math
 
+# Prefer lxml (libxml2) for parsing and writing large i3d files; fall back to the stdlib parser
+try:
+    from lxml import etree as ET
+    LXML_AVAILABLE = True
+except ImportError:
+    import xml.etree.ElementTree as ET
+    LXML_AVAILABLE = False
 
-@dataclass
+# Options for every parser reading i3d files (XMLParser, iterparse, XMLPullParser):
+# with lxml, huge_tree lifts libxml2's text size limits, which big maps can exceed
+XML_PARSER_OPTIONS = {'huge_tree': True} if LXML_AVAILABLE else {}
+
+# Read size per parser.feed() call when parsing i3d files incrementally
+STREAM_CHUNK_SIZE = 1 << 20
+
+# __slots__ dataclasses (no per-instance __dict__) need Python 3.10+; large maps create one TreeInstance per tree
+DATACLASS_OPTIONS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+
+@dataclass(**DATACLASS_OPTIONS)
 class TreeTypeStage:
     """A growth stage for a tree type."""
     stage_index: int  # 1-based index
-    variations: List[Dict[str, str]]  # List of {filename, name (optional)}
+    variations: List[Dict[str, str]]  # List of {filename, name (optional)}; stem is added on init
+    # Lowercased (stem, filename) per variation, precomputed for filename matching
+    match_names: List[Tuple[str, str]] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.match_names = []
+        for variation in self.variations:
+            var_filename = variation.get('filename', '')
+            # The stem is also kept on the variation for listings
+            stem = variation['stem'] = Path(var_filename).stem
+            self.match_names.append((stem.lower(), var_filename.lower()))
 
 
-@dataclass
+@dataclass(**DATACLASS_OPTIONS)
 class TreeTypeDesc:
     """Tree type descriptor loaded from treeTypes.xml."""
     name: str
@@ -70,16 +105,14 @@ class TreeTypeDesc:
         base_name = Path(filename).stem.lower()
 
         for stage in self.stages:
-            for var_idx, variation in enumerate(stage.variations, 1):
-                var_filename = variation.get('filename', '')
-                var_base = Path(var_filename).stem.lower()
-                if var_base == base_name or base_name in var_filename.lower():
+            for var_idx, (var_base, var_filename) in enumerate(stage.match_names, 1):
+                if var_base == base_name or base_name in var_filename:
                     return stage.stage_index, var_idx
 
         return self.max_stage, 1
 
 
-@dataclass
+@dataclass(**DATACLASS_OPTIONS)
 class TreeInstance:
     """A single tree instance from the map."""
     node_name: str
@@ -109,6 +142,11 @@ class TreeTypeLoader:
 
     def __init__(self):
         self.tree_types: Dict[str, TreeTypeDesc] = {}  # name (uppercase) -> TreeTypeDesc
+        # name (uppercase) -> max stage; loaded types override the hardcoded MAX_STAGES
+        self._max_stages: Dict[str, int] = dict(MAX_STAGES)
+        # (tree type, filename) -> (stage, variation); cleared whenever types are (re)loaded
+        self._stage_variation_cache: Dict[Tuple[str, str], Tuple[int, int]] = {}
+        self._sorted_types: Optional[List[TreeTypeDesc]] = None  # get_types() result; reset when types change
 
     def load_from_xml(self, xml_path: Path, base_directory: Optional[Path] = None) -> int:
         """
@@ -121,13 +159,15 @@ class TreeTypeLoader:
             return 0
 
         try:
-            tree = ET.parse(xml_path)
+            tree = ET.parse(str(xml_path))
             root = tree.getroot()
         except ET.ParseError as e:
             print(f"Error parsing {xml_path}: {e}")
             return 0
 
         count = 0
+        self._stage_variation_cache.clear()
+        self._sorted_types = None
         # Find treeTypes element - could be root or child
         tree_types_elem = root.find('.//treeTypes')
         if tree_types_elem is None:
@@ -175,6 +215,7 @@ class TreeTypeLoader:
                     title=title,
                     stages=stages
                 )
+                self._max_stages[name_upper] = len(stages)
                 count += 1
 
         return count
@@ -204,7 +245,7 @@ class TreeTypeLoader:
 
         # 2. Parse map.xml to find treeTypes filename
         try:
-            tree = ET.parse(map_xml_path)
+            tree = ET.parse(str(map_xml_path))
             root = tree.getroot()
             tree_types_elem = root.find('.//treeTypes')
             if tree_types_elem is not None:
@@ -239,28 +280,32 @@ class TreeTypeLoader:
 
     def get_max_stage(self, name: str) -> int:
         """Get max stage for a tree type, falling back to hardcoded if not found."""
-        tree_type = self.get_type(name)
-        if tree_type:
-            return tree_type.max_stage
-        # Fallback to hardcoded
-        return MAX_STAGES.get(name.upper(), 5)
+        return self._max_stages.get(name.upper(), 5)
 
     def find_stage_and_variation(self, tree_type_name: str, filename: str) -> Tuple[int, int]:
         """Find stage and variation for a filename. Returns (stage, variation)."""
-        tree_type = self.get_type(tree_type_name)
-        if tree_type:
-            return tree_type.find_stage_by_filename(filename)
-        # Fallback: try to extract from filename
-        stage_match = re.search(r'stage[_]?(\d+)', filename.lower())
-        var_match = re.search(r'var[_]?(\d+)', filename.lower())
-        stage = int(stage_match.group(1)) if stage_match else self.get_max_stage(tree_type_name)
-        variation = int(var_match.group(1)) if var_match else 1
-        return stage, variation
+        key = (tree_type_name, filename)
+        result = self._stage_variation_cache.get(key)
+        if result is None:
+            tree_type = self.get_type(tree_type_name)
+            if tree_type:
+                result = tree_type.find_stage_by_filename(filename)
+            else:
+                # Fallback: try to extract from filename
+                result = parse_stage_variation(filename, self.get_max_stage(tree_type_name))
+            self._stage_variation_cache[key] = result
+        return result
 
     def list_types(self) -> List[str]:
         """List all loaded tree type names."""
         return [t.name for t in self.tree_types.values()]
 
+    def get_types(self) -> List[TreeTypeDesc]:
+        """List all loaded tree types, sorted by name. The list is cached and must not be modified."""
+        if self._sorted_types is None:
+            self._sorted_types = sorted(self.tree_types.values(), key=lambda t: t.name)
+        return self._sorted_types
+
 
 # Global tree type loader instance
 _tree_type_loader: Optional[TreeTypeLoader] = None
@@ -330,53 +375,108 @@ MAX_STAGES = {
     'WILLOW': 5,
 }
 
+# All TREE_PATTERNS folded into one regex. Each alternative is a lookahead anchored at the
+# start of the name, so the first pattern (in dict order) that matches anywhere still wins.
+_TREE_PATTERN_RE = re.compile('|'.join(f'(?=(?s:.*?)({pattern}))' for pattern in TREE_PATTERNS))
+_TREE_PATTERN_INFO = list(TREE_PATTERNS.values())
+
+# Growth stage / variation numbers embedded in file and node names (e.g. "oak_stage03_var02")
+_STAGE_RE = re.compile(r'stage[_]?(\d+)')
+_VARIATION_RE = re.compile(r'var[_]?(\d+)')
+
 
+@lru_cache(maxsize=4096)
 def detect_tree_type(name: str) -> Optional[Tuple[str, int]]:
     """Detect tree type from node name. Returns (type_name, max_growth_stage) or None."""
     name_lower = name.lower().replace('_', '').replace('-', '').replace(' ', '')
 
-    for pattern, (tree_type, stages) in TREE_PATTERNS.items():
-        if re.search(pattern, name_lower):
-            return tree_type, stages
+    match = _TREE_PATTERN_RE.match(name_lower)
+    if match:
+        return _TREE_PATTERN_INFO[match.lastindex - 1]
 
     return None
 
 
+@lru_cache(maxsize=4096)
+def parse_stage_variation(name: str, default_stage: int) -> Tuple[int, int]:
+    """Extract (stage, variation) from a file or node name, e.g. "oak_stage03_var02".
+    Falls back to default_stage and variation 1 when not present."""
+    name_lower = name.lower()
+    stage_match = _STAGE_RE.search(name_lower)
+    var_match = _VARIATION_RE.search(name_lower)
+    stage = int(stage_match.group(1)) if stage_match else default_stage
+    variation = int(var_match.group(1)) if var_match else 1
+    return stage, variation
+
+
+@lru_cache(maxsize=256)
+def local_tag_name(tag: str) -> str:
+    """Strip the namespace from an element tag ("{ns}Shape" -> "Shape").
+    Cached, since documents only use a handful of distinct tags."""
+    return tag.rpartition('}')[2]
+
+
+def parse_parent_names(parent_name: Optional[str]) -> Optional[FrozenSet[str]]:
+    """Split a comma-separated --tree-parent value into lowercased names (None if there are none)."""
+    if not parent_name:
+        return None
+    return frozenset(n.strip() for n in parent_name.lower().split(',') if n.strip()) or None
+
+
 def parse_vector(value: str, default: Tuple[float, ...] = (0, 0, 0)) -> Tuple[float, ...]:
     """Parse space-separated vector string."""
     if not value:
         return default
     try:
-        return tuple(float(v) for v in value.split())
+        return tuple(map(float, value.split()))
     except ValueError:
         return default
 
 
+def parse_vectors(values: List[Optional[str]], default: Tuple[float, float, float]) -> List[Tuple[float, ...]]:
+    """
+    Parse many 3-component vector strings at once.
+
+    The given values are joined and converted in a single split/float pass instead
+    of one parse_vector() call each; missing ones get the default. The bulk pass is
+    only used when every value is exactly three components separated by single
+    spaces, so components can't shift between values; otherwise, or if a component
+    isn't a number, every value is parsed with parse_vector().
+    """
+    present = [value for value in values if value]
+    flat = None
+    if all(value.count(' ') == 2 for value in present):
+        try:
+            # Splitting on single spaces yields exactly three items per value
+            flat = list(map(float, ' '.join(present).split(' ')))
+        except ValueError:
+            pass  # Empty component from extra spaces, or not a number
+    if flat is None:
+        return [parse_vector(value, default) for value in values]
+    components = iter(flat)
+    parsed = zip(components, components, components)
+    if len(present) == len(values):
+        return list(parsed)
+    return [next(parsed) if value else default for value in values]
+
+
 def multiply_matrices(m1: List[List[float]], m2: List[List[float]]) -> List[List[float]]:
-    """Multiply two 4x4 matrices."""
-    result = [[0.0] * 4 for _ in range(4)]
-    for i in range(4):
-        for j in range(4):
-            for k in range(4):
-                result[i][j] += m1[i][k] * m2[k][j]
-    return result
-
-
-def rotation_matrix(rx: float, ry: float, rz: float) -> List[List[float]]:
-    """Create rotation matrix from Euler angles (degrees)."""
-    # Convert to radians
-    rx, ry, rz = math.radians(rx), math.radians(ry), math.radians(rz)
-
-    # Rotation matrices
-    cx, sx = math.cos(rx), math.sin(rx)
-    cy, sy = math.cos(ry), math.sin(ry)
-    cz, sz = math.cos(rz), math.sin(rz)
-
-    # Combined rotation (ZYX order, typical for i3d)
+    """Multiply two 4x4 affine transform matrices.
+
+    Both matrices are expected to have a bottom row of [0, 0, 0, 1] (as built
+    by transform_matrix), so only the upper 3x4 block is computed. Each sum
+    starts from 0.0 like a plain accumulating loop, so zero entries are never
+    -0.0 (which would flip the sign of axis-aligned output rotations).
+    """
+    (a00, a01, a02, a03), (a10, a11, a12, a13), (a20, a21, a22, a23) = m1[0], m1[1], m1[2]
+    (b00, b01, b02, b03), (b10, b11, b12, b13), (b20, b21, b22, b23) = m2[0], m2[1], m2[2]
     return [
-        [cy*cz, -cy*sz, sy, 0],
-        [sx*sy*cz + cx*sz, -sx*sy*sz + cx*cz, -sx*cy, 0],
-        [-cx*sy*cz + sx*sz, cx*sy*sz + sx*cz, cx*cy, 0],
+        [0.0 + a00*b00 + a01*b10 + a02*b20, 0.0 + a00*b01 + a01*b11 + a02*b21,
+         0.0 + a00*b02 + a01*b12 + a02*b22, 0.0 + a00*b03 + a01*b13 + a02*b23 + a03],
+        [0.0 + a10*b00 + a11*b10 + a12*b20, 0.0 + a10*b01 + a11*b11 + a12*b21,
+         0.0 + a10*b02 + a11*b12 + a12*b22, 0.0 + a10*b03 + a11*b13 + a12*b23 + a13],
+        [0.0 + a20*b00 + a21*b10 + a22*b20, 0.0 + a20*b01 + a21*b11 + a22*b21,
+         0.0 + a20*b02 + a21*b12 + a22*b22, 0.0 + a20*b03 + a21*b13 + a22*b23 + a23],
         [0, 0, 0, 1]
     ]
 
@@ -384,16 +484,25 @@ def rotation_matrix(rx: float, ry: float, rz: float) -> List[List[float]]:
 def transform_matrix(tx: float, ty: float, tz: float,
                      rx: float, ry: float, rz: float,
                      sx: float, sy: float, sz: float) -> List[List[float]]:
-    """Create full transform matrix."""
-    rot = rotation_matrix(rx, ry, rz)
-    # Apply scale and translation
-    rot[0] = [rot[0][j] * sx for j in range(4)]
-    rot[1] = [rot[1][j] * sy for j in range(4)]
-    rot[2] = [rot[2][j] * sz for j in range(4)]
-    rot[0][3] = tx
-    rot[1][3] = ty
-    rot[2][3] = tz
-    return rot
+    """Create full transform matrix: Euler rotation (degrees, ZYX order) with each
+    row scaled by its axis, and the translation in the last column."""
+    if rx or ry or rz:
+        rx, ry, rz = math.radians(rx), math.radians(ry), math.radians(rz)
+        cos_x, sin_x = math.cos(rx), math.sin(rx)
+        cos_y, sin_y = math.cos(ry), math.sin(ry)
+        cos_z, sin_z = math.cos(rz), math.sin(rz)
+    else:
+        # Unrotated node (the common case): skip the trig calls
+        cos_x = cos_y = cos_z = 1.0
+        sin_x = sin_y = sin_z = 0.0
+
+    # Combined rotation (ZYX order, typical for i3d), each row scaled by its axis
+    return [
+        [cos_y*cos_z*sx, -cos_y*sin_z*sx, sin_y*sx, tx],
+        [(sin_x*sin_y*cos_z + cos_x*sin_z)*sy, (-sin_x*sin_y*sin_z + cos_x*cos_z)*sy, -sin_x*cos_y*sy, ty],
+        [(-cos_x*sin_y*cos_z + sin_x*sin_z)*sz, (cos_x*sin_y*sin_z + sin_x*cos_z)*sz, cos_x*cos_y*sz, tz],
+        [0, 0, 0, 1]
+    ]
 
 
 def extract_world_transform(matrix: List[List[float]]) -> Tuple[Tuple[float, float, float],
@@ -403,10 +512,11 @@ def extract_world_transform(matrix: List[List[float]]) -> Tuple[Tuple[float, flo
     x, y, z = matrix[0][3], matrix[1][3], matrix[2][3]
 
     # Extract rotation (simplified - assumes no skew)
-    sy = matrix[0][2]
-    ry = math.asin(max(-1, min(1, sy)))
+    sy = max(-1.0, min(1.0, matrix[0][2]))
+    ry = math.asin(sy)
 
-    if abs(math.cos(ry)) > 0.001:
+    # cos(asin(sy)) == sqrt(1 - sy^2), which is never negative
+    if math.sqrt(1.0 - sy * sy) > 0.001:
         rx = math.atan2(-matrix[1][2], matrix[2][2])
         rz = math.atan2(-matrix[0][1], matrix[0][0])
     else:
@@ -416,18 +526,117 @@ def extract_world_transform(matrix: List[List[float]]) -> Tuple[Tuple[float, flo
     return (x, y, z), (math.degrees(rx), math.degrees(ry), math.degrees(rz))
 
 
+@contextmanager
+def atomic_write(path: Path, mode: str = 'w', **kwargs):
+    """
+    Open a temporary file next to path and move it over path once fully written.
+
+    Readers never see a half-written file, a failed write leaves the original
+    untouched, and the original file's inode is never modified (so hardlinks
+    to it, like the backups made by create_backup, keep the old contents).
+    """
+    tmp_path = path.with_name(path.name + '.tmp')
+    try:
+        with open(tmp_path, mode, **kwargs) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        if path.exists():
+            os.chmod(tmp_path, os.stat(path).st_mode & 0o7777)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if tmp_path.exists():
+            tmp_path.unlink()
+        raise
+
+
+def create_backup(source: Path, backup_path: Path):
+    """
+    Back up source as a hardlink when possible, falling back to a full copy.
+
+    A hardlink copies no data. It stays a valid backup because the i3d is only
+    ever rewritten through atomic_write, which replaces it with a new file.
+    """
+    try:
+        os.link(source, backup_path)
+    except OSError:
+        # Different filesystem, or links not supported
+        import shutil
+        shutil.copy2(source, backup_path)
+
+
 class I3DTreeExtractor:
     """Extract trees from i3d file."""
 
-    def __init__(self, i3d_path: Path):
+    # Compiled lxml XPath selecting tree File entries, per namespace URI ('' without namespace)
+    _TREE_FILE_XPATHS: Dict[str, object] = {}
+
+    def __init__(self, i3d_path: Path, streaming: bool = False, keep_tree: bool = True):
+        """
+        Args:
+            i3d_path: Path to the map .i3d file
+            streaming: Read the file in chunks with OS read-ahead while parsing
+            keep_tree: Build the full document tree, as needed by remove_trees()/save().
+                Without it, find_trees() streams the file and only keeps the
+                elements that are currently open in memory.
+        """
         self.i3d_path = i3d_path
-        self.tree = ET.parse(i3d_path)
-        self.root = self.tree.getroot()
-        self.ns = self._get_namespace()
+        self.streaming = streaming
         self.trees: List[TreeInstance] = []
         self.tree_parents: List[ET.Element] = []
         self.file_id_to_tree_type: Dict[str, Tuple[str, int, int]] = {}  # fileId -> (type, stage, var)
         self.tree_type_loader: Optional[TreeTypeLoader] = None  # Set externally if available
+        self._found_elements: Dict[str, Optional[ET.Element]] = {}  # tag -> first match, see _find_element
+
+        if keep_tree:
+            if streaming:
+                self.tree = self._parse_streaming()
+            else:
+                self.tree = ET.parse(str(i3d_path), self._create_parser())
+            self._set_root(self.tree.getroot())
+        else:
+            self.tree = None
+            self.root = None
+            self.ns: Dict[str, str] = {}  # Set from the root element once find_trees() streams the file
+
+    def _set_root(self, root: ET.Element):
+        """Set the document root and derive the namespace-qualified tags from it."""
+        self.root = root
+        self.ns = self._get_namespace()
+        # Node types that can hold trees, as fully qualified tags
+        self._reference_node_tag = self._qualified_tag('ReferenceNode')
+        self._legacy_tree_tags = (self._qualified_tag('TransformGroup'), self._qualified_tag('Shape'))
+        self._scan_tags = self._legacy_tree_tags + (self._reference_node_tag,)
+
+    @staticmethod
+    def _create_parser():
+        """Create the XML parser used for i3d files."""
+        return ET.XMLParser(**XML_PARSER_OPTIONS)
+
+    def _open_i3d(self):
+        """Open the i3d for binary reading, with OS read-ahead of the whole file when streaming."""
+        f = open(self.i3d_path, 'rb')
+        if self.streaming and hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+        return f
+
+    def _parse_streaming(self):
+        """Parse the i3d by feeding it to the parser in chunks.
+
+        The kernel is asked to read the whole file ahead in the background, so
+        disk I/O overlaps with parsing instead of stalling it chunk by chunk.
+        """
+        parser = self._create_parser()
+        with self._open_i3d() as f:
+            while True:
+                chunk = f.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                parser.feed(chunk)
+        root = parser.close()
+        if LXML_AVAILABLE:
+            return root.getroottree()
+        return ET.ElementTree(root)
 
     def _get_namespace(self) -> Dict[str, str]:
         """Extract XML namespace if present."""
@@ -437,57 +646,209 @@ class I3DTreeExtractor:
             return {'i3d': ns_uri}
         return {}
 
-    def _find_element(self, tag: str) -> Optional[ET.Element]:
-        """Find element by tag, handling namespace."""
+    def _qualified_tag(self, tag: str) -> str:
+        """Return tag with the i3d namespace prefix, if the file uses one."""
         if self.ns:
-            return self.root.find(f".//{{{self.ns['i3d']}}}{tag}")
-        return self.root.find(f".//{tag}")
+            return f"{{{self.ns['i3d']}}}{tag}"
+        return tag
+
+    def _find_element(self, tag: str) -> Optional[ET.Element]:
+        """Find element by tag, handling namespace.
+
+        Results are cached: each lookup is a depth-first search of the document, and
+        the sections looked up this way (Scene, Files) are never removed.
+        """
+        if tag not in self._found_elements:
+            self._found_elements[tag] = self.root.find(f".//{self._qualified_tag(tag)}")
+        return self._found_elements[tag]
 
     def _iter_elements(self, tag: str):
         """Iterate over elements by tag, handling namespace."""
-        if self.ns:
-            yield from self.root.iter(f"{{{self.ns['i3d']}}}{tag}")
-        else:
-            yield from self.root.iter(tag)
+        yield from self.root.iter(self._qualified_tag(tag))
+
+    def _tree_file_xpath(self):
+        """Return the compiled lxml XPath selecting the File children that reference tree files."""
+        ns_uri = self.ns.get('i3d', '')
+        xpath = self._TREE_FILE_XPATHS.get(ns_uri)
+        if xpath is None:
+            file_tag = 'i3d:File' if ns_uri else 'File'
+            xpath = ET.XPath(f'{file_tag}[contains(@filename, "/trees/")]', namespaces=self.ns)
+            self._TREE_FILE_XPATHS[ns_uri] = xpath
+        return xpath
+
+    def _iter_scan_children(self, elem: ET.Element):
+        """Iterate over the TransformGroup/Shape/ReferenceNode children of elem, in document order."""
+        if LXML_AVAILABLE:
+            return elem.iterchildren(*self._scan_tags)
+        scan_tags = self._scan_tags
+        return (child for child in elem if child.tag in scan_tags)
+
+    def _register_file(self, elem: ET.Element):
+        """Add a File element to the fileId map if it references a tree .i3d."""
+        file_id = elem.get('fileId')
+        filename = elem.get('filename', '')
+
+        # Check if this is a tree file
+        if '/trees/' in filename and filename.endswith('.i3d'):
+            # Parse tree type and stage from filename
+            # e.g., "$data/maps/trees/oak/oak_stage05.i3d"
+            basename = Path(filename).stem  # oak_stage05
+
+            # Detect tree type
+            tree_info = detect_tree_type(basename)
+            if tree_info:
+                tree_type, max_stage = tree_info
+
+                # Use tree type loader if available for more accurate stage/variation detection
+                if self.tree_type_loader:
+                    stage, variation = self.tree_type_loader.find_stage_and_variation(tree_type, basename)
+                else:
+                    # Fallback: extract stage and variation numbers from filename
+                    stage, variation = parse_stage_variation(basename, max_stage)
+
+                self.file_id_to_tree_type[file_id] = (tree_type, stage, variation)
 
     def _build_file_id_map(self):
         """Build mapping from fileId to tree type info from File elements."""
         self.file_id_to_tree_type = {}
 
-        # Find Files section
-        for elem in self.root.iter():
-            tag = elem.tag
-            if self.ns:
-                tag = tag.replace(f"{{{self.ns['i3d']}}}", "")
-
-            if tag == 'File':
-                file_id = elem.get('fileId')
-                filename = elem.get('filename', '')
-
-                # Check if this is a tree file
-                if '/trees/' in filename and filename.endswith('.i3d'):
-                    # Parse tree type and stage from filename
-                    # e.g., "$data/maps/trees/oak/oak_stage05.i3d"
-                    basename = Path(filename).stem  # oak_stage05
-
-                    # Detect tree type
-                    tree_info = detect_tree_type(basename)
-                    if tree_info:
-                        tree_type, max_stage = tree_info
-
-                        # Use tree type loader if available for more accurate stage/variation detection
-                        if self.tree_type_loader:
-                            stage, variation = self.tree_type_loader.find_stage_and_variation(tree_type, basename)
-                        else:
-                            # Fallback: extract stage number from filename
-                            stage_match = re.search(r'stage[_]?(\d+)', basename.lower())
-                            stage = int(stage_match.group(1)) if stage_match else max_stage
-
-                            # Extract variation
-                            var_match = re.search(r'var[_]?(\d+)', basename.lower())
-                            variation = int(var_match.group(1)) if var_match else 1
-
-                        self.file_id_to_tree_type[file_id] = (tree_type, stage, variation)
+        # File entries live directly under <Files>, near the top of the document, so only that
+        # section is visited instead of the whole scene graph
+        files_elem = self._find_element('Files')
+        if files_elem is not None and LXML_AVAILABLE:
+            # Non-tree files are skipped by libxml2 without creating Python elements for them
+            file_elems = self._tree_file_xpath()(files_elem)
+        elif files_elem is not None:
+            file_elems = files_elem.iterfind(self._qualified_tag('File'))
+        else:
+            file_elems = self._iter_elements('File')
+
+        for elem in file_elems:
+            self._register_file(elem)
+
+    def _scan_node(self, elem: ET.Element, parent: ET.Element, parent_index: int, in_tree_parent: bool,
+                   parent_names: Optional[FrozenSet[str]], nodes: list, candidates: list) -> Tuple[int, bool]:
+        """
+        Record one scene node and check whether it is a tree.
+
+        Appends (parent index, translation, rotation, scale) to nodes, and tree
+        candidates as (node index, name, referenceId, (type, stage, var), element, parent).
+        ReferenceNode candidates are resolved through the fileId map once it is complete.
+
+        Returns (node index, in_tree_parent) for the node's children.
+        """
+        tag = elem.tag  # Compared fully qualified, so no namespace stripping per node
+        name = elem.get('name', '')
+
+        # Check if this is one of the tree parents we're looking for
+        if parent_names and name.lower() in parent_names:
+            in_tree_parent = True
+            if elem not in self.tree_parents:
+                self.tree_parents.append(elem)
+
+        index = len(nodes)
+        nodes.append((parent_index, elem.get('translation'), elem.get('rotation'), elem.get('scale')))
+
+        if parent_names and not in_tree_parent:
+            return index, in_tree_parent
+
+        # Streamed elements are discarded after parsing, so only keep references into a full tree
+        elem_ref, parent_ref = (elem, parent) if self.tree is not None else (None, None)
+
+        # Check if this is a ReferenceNode pointing to a tree
+        if tag == self._reference_node_tag:
+            ref_id = elem.get('referenceId')
+            if ref_id:
+                candidates.append((index, name, ref_id, None, elem_ref, parent_ref))
+
+        # Also check TransformGroup/Shape nodes with tree-like names (legacy support)
+        elif tag in self._legacy_tree_tags:
+            tree_info = detect_tree_type(name)
+            if tree_info:
+                tree_type, max_stage = tree_info
+
+                # Detect growth stage and variation from name if present
+                growth_state, variation = parse_stage_variation(name, max_stage)
+
+                candidates.append((index, name, None, (tree_type, growth_state, variation), elem_ref, parent_ref))
+
+        return index, in_tree_parent
+
+    def _scan_tree(self, parent_names: Optional[FrozenSet[str]], nodes: list, candidates: list) -> bool:
+        """Collect nodes and tree candidates from the parsed document. Returns False if there is no Scene."""
+        scene = self._find_element('Scene')
+        if scene is None:
+            return False
+
+        scan_node = self._scan_node
+        iter_scan_children = self._iter_scan_children
+
+        # Explicit stack instead of recursion: deep hierarchies can't hit the recursion limit.
+        # Children are pushed in reverse so nodes are visited in document order.
+        # lxml also yields comments and processing instructions, whose tag is not a string.
+        stack = [(child, scene, -1, not parent_names)
+                 for child in reversed(scene) if isinstance(child.tag, str)]
+
+        while stack:
+            elem, parent, parent_index, in_tree_parent = stack.pop()
+            index, in_tree_parent = scan_node(elem, parent, parent_index, in_tree_parent,
+                                              parent_names, nodes, candidates)
+
+            # Descend into children for TransformGroups
+            stack.extend(reversed([(child, elem, index, in_tree_parent)
+                                   for child in iter_scan_children(elem)]))
+
+        return True
+
+    def _scan_stream(self, parent_names: Optional[FrozenSet[str]], nodes: list, candidates: list) -> bool:
+        """
+        Collect File entries, nodes and tree candidates in a single iterparse pass,
+        without building the document tree. Returns False if there is no Scene.
+
+        Node attributes are read on the start event; every element is dropped
+        again on its end event, so memory is bounded by the nesting depth.
+        """
+        self.file_id_to_tree_type = {}
+        scene = None
+        open_elems = []  # (element, node index or None if not scanned, in_tree_parent) per open element
+        with self._open_i3d() as f:
+            for event, elem in ET.iterparse(f, events=('start', 'end'), **XML_PARSER_OPTIONS):
+                if event == 'end':
+                    open_elems.pop()
+                    if open_elems:
+                        elem.clear()
+                        open_elems[-1][0].remove(elem)
+                    continue
+
+                if not open_elems:
+                    # Document root: derive the namespace and qualified tags
+                    self._set_root(elem)
+                    file_tag = self._qualified_tag('File')
+                    scene_tag = self._qualified_tag('Scene')
+                    scan_tags = self._scan_tags
+                    open_elems.append((elem, None, False))
+                    continue
+
+                parent, parent_index, in_tree_parent = open_elems[-1]
+                index = None
+                tag = elem.tag
+
+                # Same selection as _scan_tree: every child of Scene, then tree-capable nodes below them
+                if parent is scene:
+                    index, in_tree_parent = self._scan_node(elem, parent, -1, in_tree_parent,
+                                                            parent_names, nodes, candidates)
+                elif parent_index is not None and tag in scan_tags:
+                    index, in_tree_parent = self._scan_node(elem, parent, parent_index, in_tree_parent,
+                                                            parent_names, nodes, candidates)
+                elif tag == file_tag:
+                    self._register_file(elem)
+                elif tag == scene_tag and scene is None:
+                    scene = elem
+                    in_tree_parent = not parent_names
+
+                open_elems.append((elem, index, in_tree_parent))
+
+        return scene is not None
 
     def find_trees(self, parent_name: Optional[str] = None) -> List[TreeInstance]:
         """
@@ -498,125 +859,105 @@ class I3DTreeExtractor:
 
         Args:
             parent_name: If specified, only search under nodes with this name
+                (case-insensitive; several names can be given separated by commas)
         """
-        # First build the file ID to tree type mapping
-        self._build_file_id_map()
+        self.trees = []
+        parent_names = parse_parent_names(parent_name)  # Matched by set lookup per node
+
+        # Pass 1: walk the scene once, recording every node's parent and local transform
+        # attributes plus the tree candidates. World matrices are only needed for trees
+        # and their ancestors, so they are built afterwards.
+        nodes: List[Tuple[int, Optional[str], Optional[str], Optional[str]]] = []
+        candidates: List[tuple] = []
+
+        if self.tree is None:
+            found_scene = self._scan_stream(parent_names, nodes, candidates)
+        else:
+            # First build the file ID to tree type mapping
+            self._build_file_id_map()
+            found_scene = self._scan_tree(parent_names, nodes, candidates)
 
         if self.file_id_to_tree_type:
             print(f"Found {len(self.file_id_to_tree_type)} tree type definitions (ReferenceNode mode)")
         else:
             print("No tree file references found, scanning for inline tree nodes...")
 
-        self.trees = []
-        identity = [[1,0,0,0], [0,1,0,0], [0,0,1,0], [0,0,0,1]]
-
-        def scan_node(elem: ET.Element, parent: Optional[ET.Element],
-                      parent_matrix: List[List[float]], in_tree_parent: bool):
-            """Recursively scan for tree nodes."""
-            tag = elem.tag
-            if self.ns:
-                tag = tag.replace(f"{{{self.ns['i3d']}}}", "")
-
-            name = elem.get('name', '')
-
-            # Check if this is the tree parent we're looking for
-            if parent_name and name.lower() == parent_name.lower():
-                in_tree_parent = True
-                if elem not in self.tree_parents:
-                    self.tree_parents.append(elem)
+        if not found_scene:
+            print("Warning: No Scene element found in i3d")
+            return []
 
-            # Get local transform
-            trans = parse_vector(elem.get('translation'), (0, 0, 0))
-            rot = parse_vector(elem.get('rotation'), (0, 0, 0))
-            scale = parse_vector(elem.get('scale'), (1, 1, 1))
+        # Pass 2: build world matrices along the paths leading to trees, sharing
+        # each ancestor's matrix between all trees below it.
+        identity = [[1,0,0,0], [0,1,0,0], [0,0,1,0], [0,0,0,1]]
+        world_matrices: Dict[int, List[List[float]]] = {-1: identity}
+
+        def get_world_matrix(index: int) -> List[List[float]]:
+            path = []
+            while index not in world_matrices:
+                path.append(index)
+                index = nodes[index][0]
+            matrix = world_matrices[index]
+            for node_index in reversed(path):
+                _, translation, rotation, scale_attr = nodes[node_index]
+                trans = parse_vector(translation, (0, 0, 0))
+                rot = parse_vector(rotation, (0, 0, 0))
+                scale = parse_vector(scale_attr, (1, 1, 1))
+                local_matrix = transform_matrix(
+                    trans[0], trans[1], trans[2],
+                    rot[0], rot[1], rot[2],
+                    scale[0], scale[1], scale[2]
+                )
+                matrix = multiply_matrices(matrix, local_matrix)
+                world_matrices[node_index] = matrix
+            return matrix
+
+        file_id_to_tree_type = self.file_id_to_tree_type
+        found = []
+        tree_nodes = []
+
+        for index, name, ref_id, tree_info, elem, parent in candidates:
+            if ref_id is not None:
+                tree_info = file_id_to_tree_type.get(ref_id)
+                if tree_info is None:
+                    continue  # ReferenceNode to something other than a tree
+            found.append((name, tree_info, elem, parent))
+            tree_nodes.append(nodes[index])
+
+        # The trees' own transforms are decoded in bulk; only their ancestors go through
+        # get_world_matrix(), which also keeps the per-tree matrices out of the cache
+        translations = parse_vectors([node[1] for node in tree_nodes], (0, 0, 0))
+        rotations = parse_vectors([node[2] for node in tree_nodes], (0, 0, 0))
+        scales = parse_vectors([node[3] for node in tree_nodes], (1, 1, 1))
+
+        for (name, tree_info, elem, parent), node, trans, rot, scale in zip(
+                found, tree_nodes, translations, rotations, scales):
+            tree_type, growth_state, variation = tree_info
 
-            # Build local matrix and combine with parent
             local_matrix = transform_matrix(
                 trans[0], trans[1], trans[2],
                 rot[0], rot[1], rot[2],
                 scale[0], scale[1], scale[2]
             )
-            world_matrix = multiply_matrices(parent_matrix, local_matrix)
-
-            # Check if this is a ReferenceNode pointing to a tree
-            if tag == 'ReferenceNode':
-                ref_id = elem.get('referenceId')
-                if ref_id and ref_id in self.file_id_to_tree_type:
-                    if not parent_name or in_tree_parent:
-                        tree_type, stage, variation = self.file_id_to_tree_type[ref_id]
-                        world_pos, world_rot = extract_world_transform(world_matrix)
-
-                        self.trees.append(TreeInstance(
-                            node_name=name,
-                            tree_type=tree_type,
-                            x=world_pos[0],
-                            y=world_pos[1],
-                            z=world_pos[2],
-                            rx=world_rot[0],
-                            ry=world_rot[1],
-                            rz=world_rot[2],
-                            sx=scale[0],
-                            sy=scale[1],
-                            sz=scale[2],
-                            growth_state=stage,
-                            variation_index=variation,
-                            element=elem,
-                            parent=parent
-                        ))
-
-            # Also check TransformGroup/Shape nodes with tree-like names (legacy support)
-            elif tag in ('TransformGroup', 'Shape'):
-                tree_info = detect_tree_type(name)
-                if tree_info and (not parent_name or in_tree_parent):
-                    tree_type, max_stage = tree_info
-                    world_pos, world_rot = extract_world_transform(world_matrix)
-
-                    # Detect growth stage from name if present
-                    growth_state = max_stage
-                    stage_match = re.search(r'stage[_]?(\d+)', name.lower())
-                    if stage_match:
-                        growth_state = int(stage_match.group(1))
-
-                    # Detect variation from name if present
-                    variation = 1
-                    var_match = re.search(r'var[_]?(\d+)', name.lower())
-                    if var_match:
-                        variation = int(var_match.group(1))
-
-                    self.trees.append(TreeInstance(
-                        node_name=name,
-                        tree_type=tree_type,
-                        x=world_pos[0],
-                        y=world_pos[1],
-                        z=world_pos[2],
-                        rx=world_rot[0],
-                        ry=world_rot[1],
-                        rz=world_rot[2],
-                        sx=scale[0],
-                        sy=scale[1],
-                        sz=scale[2],
-                        growth_state=growth_state,
-                        variation_index=variation,
-                        element=elem,
-                        parent=parent
-                    ))
-
-            # Recurse into children for TransformGroups
-            for child in elem:
-                child_tag = child.tag
-                if self.ns:
-                    child_tag = child_tag.replace(f"{{{self.ns['i3d']}}}", "")
-                if child_tag in ('TransformGroup', 'Shape', 'ReferenceNode'):
-                    scan_node(child, elem, world_matrix, in_tree_parent)
-
-        # Find Scene node and start scanning
-        scene = self._find_element('Scene')
-        if scene is None:
-            print("Warning: No Scene element found in i3d")
-            return []
-
-        for child in scene:
-            scan_node(child, scene, identity, parent_name is None)
+            world_matrix = multiply_matrices(get_world_matrix(node[0]), local_matrix)
+            world_pos, world_rot = extract_world_transform(world_matrix)
+
+            self.trees.append(TreeInstance(
+                node_name=name,
+                tree_type=tree_type,
+                x=world_pos[0],
+                y=world_pos[1],
+                z=world_pos[2],
+                rx=world_rot[0],
+                ry=world_rot[1],
+                rz=world_rot[2],
+                sx=scale[0],
+                sy=scale[1],
+                sz=scale[2],
+                growth_state=growth_state,
+                variation_index=variation,
+                element=elem,
+                parent=parent
+            ))
 
         return self.trees
 
@@ -635,55 +976,209 @@ class I3DTreeExtractor:
         return removed
 
     def save(self, output_path: Path):
-        """Save modified i3d."""
-        self.tree.write(output_path, encoding='utf-8', xml_declaration=True)
-
+        """Save modified i3d (replaces output_path with a new file, see atomic_write)."""
+        with atomic_write(output_path, 'wb') as f:
+            self.tree.write(f, encoding='utf-8', xml_declaration=True)
 
-def generate_treeplant_xml(trees: List[TreeInstance], output_path: Path, loader: Optional[TreeTypeLoader] = None):
-    """Generate treePlant.xml from extracted trees."""
-    lines = ['<?xml version="1.0" encoding="utf-8" standalone="no"?>']
-    lines.append('<treePlant>')
-
-    final_stage_count = 0
-    growing_count = 0
 
-    for tree in trees:
-        pos = f"{tree.x:.4f} {tree.y:.4f} {tree.z:.4f}"
-        rot = f"{tree.rx:.4f} {tree.ry:.4f} {tree.rz:.4f}"
+def _find_scene_range(f) -> Optional[Tuple[int, int]]:
+    """
+    Return the (start, end) byte range of the <Scene> element in the open i3d file, or None.
 
-        attrs = [
-            f'treeType="{tree.tree_type.upper()}"',
-            f'position="{pos}"',
-            f'rotation="{rot}"',
-            f'growthStateI="{tree.growth_state}"',
-        ]
+    The file is searched as raw bytes through mmap. None is also returned when
+    the position can't be trusted: no unprefixed <Scene>...</Scene> found, or a
+    comment/CDATA/DOCTYPE ("<!") before it that could contain the text. Anything
+    else that makes the range invalid surfaces as a parse error of the range.
+    """
+    try:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start = mm.find(b'<Scene')
+            # Skip longer tag names starting with Scene
+            while start != -1 and mm[start + 6:start + 7] not in (b'>', b'/', b' ', b'\t', b'\n', b'\r'):
+                start = mm.find(b'<Scene', start + 6)
+            if start == -1 or mm.rfind(b'<!', 0, start) != -1:
+                return None
+            end = mm.rfind(b'</Scene>', start)
+            if end == -1:
+                return None
+            return start, end + len(b'</Scene>')
+    except (OSError, ValueError):
+        return None  # Empty file or not mappable
+
+
+# XML declaration encoding, as found in the first bytes of an ASCII-compatible file
+_XML_ENCODING_RE = re.compile(rb'^(?:\xef\xbb\xbf)?<\?xml[^>]*?\bencoding\s*=\s*["\']([A-Za-z0-9._-]+)["\']')
+
+
+def _is_ascii_compatible(head: bytes) -> bool:
+    """
+    Check from the first bytes of an XML file that ASCII text is stored as plain ASCII bytes.
+
+    False for UTF-16/UTF-32 (with or without byte order mark) and for declared
+    encodings that don't encode ASCII characters as themselves, or are unknown.
+    """
+    if head.startswith((codecs.BOM_UTF32_LE, codecs.BOM_UTF32_BE, codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return False
+    if b'\x00' in head:
+        return False  # UTF-16/32 without byte order mark
+    match = _XML_ENCODING_RE.match(head)
+    if match is None:
+        return True  # No declared encoding: UTF-8
+    sample = 'name="Trees_01" <>&;'
+    try:
+        return sample.encode(match.group(1).decode('ascii')) == sample.encode('ascii')
+    except (LookupError, UnicodeError):
+        return False
+
+
+def _quick_has_tree_parent(i3d_path: Path, parent_names: FrozenSet[str]) -> bool:
+    """
+    Check whether the i3d can contain a node named like one of parent_names, without parsing it.
+
+    The raw bytes are searched through mmap for a matching name attribute
+    (case-insensitive, like the parent matching itself). This only works for
+    files in an ASCII-compatible encoding; for any other file True is returned.
+    False means there is certainly no such node; True can be a false positive
+    (e.g. a match in a comment) and only means the file has to be parsed.
+    """
+    # Names that would be escaped or encoded differently in the file can't be searched as plain bytes
+    if any(not name.isascii() or set(name) & set('&<>"\'') for name in parent_names):
+        return True
+
+    names = b'|'.join(re.escape(name.encode('ascii')) for name in parent_names)
+    pattern = re.compile(rb'\bname\s*=\s*["\'](?:' + names + rb')["\']', re.IGNORECASE)
+    try:
+        with open(i3d_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if not _is_ascii_compatible(mm[:256]):
+                return True  # e.g. UTF-16: names aren't stored as the searched bytes
+            return pattern.search(mm) is not None
+    except (OSError, ValueError):
+        return True  # Empty file or not mappable; leave the error to the parser
+
+
+def _iter_pull_events(f, start: int, end: int):
+    """Yield (event, element) start/end events for the element stored at bytes start:end."""
+    parser = ET.XMLPullParser(events=('start', 'end'), **XML_PARSER_OPTIONS)
+
+    # Feed the XML declaration first, so the declared encoding (often iso-8859-1) still applies
+    f.seek(0)
+    head = f.read(256)
+    declaration_start = head.find(b'<?xml')
+    declaration_end = head.find(b'?>')
+    if 0 <= declaration_start <= 3 and declaration_end != -1:  # Possibly after a byte order mark
+        parser.feed(head[:declaration_end + 2])
+
+    f.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        chunk = f.read(min(remaining, STREAM_CHUNK_SIZE))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        parser.feed(chunk)
+        yield from parser.read_events()
+    parser.close()
+    yield from parser.read_events()
+
+
+def _collect_scene_children(events) -> Optional[List[Tuple[str, str]]]:
+    """Collect (name, node type) of Scene's direct children from start/end events, stopping at the end of Scene."""
+    children = None
+    scene_depth = None
+    open_elems = []
+
+    for event, elem in events:
+        if event == 'start':
+            tag = elem.tag
+            if not open_elems:
+                # Document root: Scene and its children are in the root's namespace, so tags are
+                # compared fully qualified and stripped by slicing off the known prefix
+                prefix = tag[:tag.index('}') + 1] if tag.startswith('{') else ''
+                prefix_len = len(prefix)
+                scene_tag = prefix + 'Scene'
+            open_elems.append(elem)
+            if scene_depth is None:
+                if tag == scene_tag:
+                    scene_depth = len(open_elems)
+                    children = []
+            elif len(open_elems) == scene_depth + 1:
+                node_type = tag[prefix_len:] if tag.startswith(prefix) else local_tag_name(tag)
+                children.append((elem.get('name', '(unnamed)'), node_type))
+            continue
+
+        if len(open_elems) == scene_depth:
+            break  # End of Scene, the rest of the file is not needed
+        open_elems.pop()
+        if open_elems:
+            elem.clear()
+            open_elems[-1].remove(elem)
+
+    return children
+
+
+def list_scene_children(i3d_path: Path) -> Optional[List[Tuple[str, str]]]:
+    """
+    List (name, node type) of the direct children of the i3d's Scene element.
+
+    If the Scene element can be located in the raw bytes, only that range is
+    parsed and everything in front of it is never tokenized. Otherwise the file
+    is parsed incrementally from the start. Either way parsing stops at the end
+    of Scene and finished elements are dropped, so no document tree is built.
+    Returns None if there is no Scene element.
+    """
+    with open(i3d_path, 'rb') as f:
+        scene_range = _find_scene_range(f)
+        if scene_range is not None:
+            try:
+                return _collect_scene_children(_iter_pull_events(f, *scene_range))
+            except ET.ParseError:
+                pass  # Scene isn't parseable on its own (e.g. uses prefixes declared on the root)
+
+        f.seek(0)
+        return _collect_scene_children(ET.iterparse(f, events=('start', 'end'), **XML_PARSER_OPTIONS))
+
+
+# One <tree> line of treePlant.xml; the variationIndex attribute is only written when it isn't 1
+_TREE_LINE_FORMAT = ('    <tree treeType="{}" position="{:.4f} {:.4f} {:.4f}" rotation="{:.4f} {:.4f} {:.4f}" '
+                     'growthStateI="{}"{} isGrowing="{}" splitShapeFileId="-1"/>\n')
 
-        if tree.variation_index != 1:
-            attrs.append(f'variationIndex="{tree.variation_index}"')
 
-        # Determine if tree is at final stage (shouldn't grow)
-        # Use loader for max stage if available
-        if loader:
-            max_stage = loader.get_max_stage(tree.tree_type)
-        else:
-            max_stage = MAX_STAGES.get(tree.tree_type.upper(), 5)
-        is_at_final_stage = tree.growth_state >= max_stage
+def generate_treeplant_xml(trees: List[TreeInstance], output_path: Path, loader: Optional[TreeTypeLoader] = None):
+    """Generate treePlant.xml from extracted trees."""
+    final_stage_count = 0
+    type_info: Dict[str, Tuple[str, int]] = {}  # tree_type -> (treeType attribute, max stage)
+
+    # Lines are written straight into a large write buffer instead of being joined in memory first.
+    # The file only replaces output_path once complete, so an interrupted run leaves the old one.
+    with atomic_write(output_path, 'w', encoding='utf-8', buffering=1 << 20) as f:
+        f.write('<?xml version="1.0" encoding="utf-8" standalone="no"?>\n<treePlant>\n')
+
+        for tree in trees:
+            info = type_info.get(tree.tree_type)
+            if info is None:
+                # Use loader for max stage if available
+                if loader:
+                    max_stage = loader.get_max_stage(tree.tree_type)
+                else:
+                    max_stage = MAX_STAGES.get(tree.tree_type.upper(), 5)
+                info = type_info[tree.tree_type] = (tree.tree_type.upper(), max_stage)
+            tree_type, max_stage = info
 
-        if is_at_final_stage:
-            attrs.append('isGrowing="false"')
-            final_stage_count += 1
-        else:
-            attrs.append('isGrowing="true"')
-            growing_count += 1
+            # Determine if tree is at final stage (shouldn't grow)
+            is_at_final_stage = tree.growth_state >= max_stage
+            if is_at_final_stage:
+                final_stage_count += 1
 
-        attrs.append('splitShapeFileId="-1"')
+            variation = f' variationIndex="{tree.variation_index}"' if tree.variation_index != 1 else ''
 
-        lines.append(f'    <tree {" ".join(attrs)}/>')
+            f.write(_TREE_LINE_FORMAT.format(
+                tree_type, tree.x, tree.y, tree.z, tree.rx, tree.ry, tree.rz,
+                tree.growth_state, variation, 'false' if is_at_final_stage else 'true'
+            ))
 
-    lines.append('</treePlant>')
+        f.write('</treePlant>')
 
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write('\n'.join(lines))
+    growing_count = len(trees) - final_stage_count
 
     print(f"  Final stage (isGrowing=false): {final_stage_count}")
     print(f"  Growing (isGrowing=true): {growing_count}")
@@ -693,34 +1188,30 @@ def print_summary(trees: List[TreeInstance], loader: Optional[TreeTypeLoader] =
     """Print summary of found trees."""
     print(f"\nFound {len(trees)} trees:")
 
-    # Group by type
-    by_type: Dict[str, List[TreeInstance]] = {}
-    for tree in trees:
-        if tree.tree_type not in by_type:
-            by_type[tree.tree_type] = []
-        by_type[tree.tree_type].append(tree)
+    # Group by type: a single counting pass over the trees, per type and growth state
+    by_type: Dict[str, Dict[int, int]] = {}  # tree type -> growth state -> count
+    for (tree_type, growth_state), count in Counter((t.tree_type, t.growth_state) for t in trees).items():
+        by_type.setdefault(tree_type, {})[growth_state] = count
 
     total_final = 0
     total_growing = 0
 
     for tree_type in sorted(by_type.keys()):
-        tree_list = by_type[tree_type]
+        stages = by_type[tree_type]
+        type_count = sum(stages.values())
         # Use loader for max stage if available, otherwise fallback
         if loader:
             max_stage = loader.get_max_stage(tree_type)
         else:
             max_stage = MAX_STAGES.get(tree_type.upper(), 5)
-        final_count = sum(1 for t in tree_list if t.growth_state >= max_stage)
-        growing_count = len(tree_list) - final_count
+        final_count = sum(count for stage, count in stages.items() if stage >= max_stage)
+        growing_count = type_count - final_count
         total_final += final_count
         total_growing += growing_count
 
-        print(f"  {tree_type}: {len(tree_list)} (max stage: {max_stage})")
+        print(f"  {tree_type}: {type_count} (max stage: {max_stage})")
 
         # Show growth state distribution
-        stages = {}
-        for t in tree_list:
-            stages[t.growth_state] = stages.get(t.growth_state, 0) + 1
         if len(stages) > 1:
             stage_str = ", ".join(f"stage {s}: {c}" for s, c in sorted(stages.items()))
             print(f"    ({stage_str})")
@@ -733,14 +1224,16 @@ def print_summary(trees: List[TreeInstance], loader: Optional[TreeTypeLoader] =
 
     # Bounding box
     if trees:
-        min_x = min(t.x for t in trees)
-        max_x = max(t.x for t in trees)
-        min_z = min(t.z for t in trees)
-        max_z = max(t.z for t in trees)
+        # Pull the two coordinate columns out once; min()/max() then run over plain float lists
+        xs = [t.x for t in trees]
+        zs = [t.z for t in trees]
+        min_x, max_x = min(xs), max(xs)
+        min_z, max_z = min(zs), max(zs)
         print(f"\nBounding box: X [{min_x:.1f}, {max_x:.1f}], Z [{min_z:.1f}, {max_z:.1f}]")
 
 
-def main():
+def build_arg_parser() -> argparse.ArgumentParser:
+    """Build the command line parser."""
     parser = argparse.ArgumentParser(
         description='Convert static trees from i3d to treePlant.xml',
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -758,6 +1251,9 @@ Examples:
   # Only extract trees under "trees" node
   %(prog)s map.i3d -o treePlant.xml --tree-parent trees
 
+  # Extract trees under several parent nodes
+  %(prog)s map.i3d -o treePlant.xml --tree-parent trees,forest
+
   # Load tree types from map.xml (auto-detects treeTypes.xml reference)
   %(prog)s map.i3d -o treePlant.xml --map-xml path/to/map.xml
 
@@ -769,17 +1265,21 @@ Examples:
 
   # List loaded tree types
   %(prog)s map.i3d --map-xml map.xml --list-tree-types
+
+  # Convert every map in a folder, writing <map>_treePlant.xml files to out/
+  %(prog)s --batch maps/ -o out/ --map-xml map.xml --jobs 4
 """
     )
 
-    parser.add_argument('i3d', type=Path, help='Input map .i3d file')
-    parser.add_argument('-o', '--output', type=Path, help='Output treePlant.xml path')
+    parser.add_argument('i3d', type=Path, nargs='?', help='Input map .i3d file')
+    parser.add_argument('-o', '--output', type=Path,
+                       help='Output treePlant.xml path (output folder with --batch)')
     parser.add_argument('--preview', action='store_true',
                        help='Preview found trees without writing files')
     parser.add_argument('--remove-from-i3d', action='store_true',
                        help='Remove trees from i3d (creates .i3d.backup)')
     parser.add_argument('--tree-parent', metavar='NAME',
-                       help='Only extract trees under this parent node name')
+                       help='Only extract trees under this parent node name (comma-separated for several)')
     parser.add_argument('--list-nodes', action='store_true',
                        help='List all top-level node names (for finding tree parent)')
 
@@ -792,10 +1292,44 @@ Examples:
                        help='Path to specific treeTypes.xml file')
     parser.add_argument('--list-tree-types', action='store_true',
                        help='List all loaded tree types and exit')
+    parser.add_argument('--streaming', action='store_true',
+                       help='Read the i3d in chunks with OS read-ahead while parsing (for very large maps)')
+
+    # Batch options
+    parser.add_argument('--batch', type=Path, metavar='DIR',
+                       help='Convert every .i3d file in this folder instead of a single map')
+    parser.add_argument('--jobs', type=int, metavar='N',
+                       help='Number of maps converted in parallel with --batch (default: CPU count)')
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+
+    # A value like "," must not silently turn into "no filter" and extract (or remove) everything
+    if args.tree_parent and parse_parent_names(args.tree_parent) is None:
+        parser.error('--tree-parent needs at least one node name')
 
-    args = parser.parse_args()
+    if args.batch and args.i3d is not None:
+        parser.error('an i3d file and --batch DIR cannot be combined')
+    if args.jobs is not None and not args.batch:
+        parser.error('--jobs only applies to --batch')
+    if args.jobs is not None and args.jobs < 1:
+        parser.error('--jobs must be at least 1')
 
-    if not args.i3d.exists():
+    if args.batch:
+        if not args.batch.is_dir():
+            print(f"Error: Folder not found: {args.batch}")
+            return 1
+        # Checked up front, before every map of the batch is parsed only to fail on it
+        if args.remove_from_i3d and not args.output:
+            print("Error: --remove-from-i3d requires --output")
+            return 1
+    elif args.i3d is None:
+        parser.error('an i3d file or --batch DIR is required')
+    elif not args.i3d.exists():
         print(f"Error: File not found: {args.i3d}")
         return 1
 
@@ -826,37 +1360,56 @@ Examples:
             print("No tree types loaded. Use --map-xml or --tree-types to load tree type definitions.")
         else:
             print(f"\nLoaded {len(loader.tree_types)} tree types:")
-            for name in sorted(loader.list_types()):
-                tree_type = loader.get_type(name)
-                if tree_type:
-                    print(f"  {tree_type.name} ({tree_type.split_type}): {tree_type.max_stage} stages")
-                    for stage in tree_type.stages:
-                        var_info = ", ".join(Path(v['filename']).stem for v in stage.variations if v.get('filename'))
-                        print(f"    Stage {stage.stage_index}: {var_info}")
+            for tree_type in loader.get_types():
+                print(f"  {tree_type.name} ({tree_type.split_type}): {tree_type.max_stage} stages")
+                for stage in tree_type.stages:
+                    var_info = ", ".join(v['stem'] for v in stage.variations if v.get('filename'))
+                    print(f"    Stage {stage.stage_index}: {var_info}")
         return 0
 
-    print(f"Parsing {args.i3d}...")
-    extractor = I3DTreeExtractor(args.i3d)
-
-    # Pass tree type loader to extractor if loaded
-    if tree_types_loaded:
-        extractor.tree_type_loader = loader
-
-    if args.list_nodes:
-        # Just list top-level nodes
-        scene = extractor._find_element('Scene')
-        if scene:
-            print("\nTop-level nodes in Scene:")
-            for child in scene:
-                name = child.get('name', '(unnamed)')
-                tag = child.tag
-                if extractor.ns:
-                    tag = tag.replace(f"{{{extractor.ns['i3d']}}}", "")
-                print(f"  {name} ({tag})")
-        return 0
+    if args.batch:
+        return convert_batch(args, loader if tree_types_loaded else None)
+
+    return convert_i3d(args.i3d, args, args.output, loader if tree_types_loaded else None)
+
+
+def convert_i3d(i3d_path: Path, args: argparse.Namespace, output_path: Optional[Path],
+                loader: Optional[TreeTypeLoader]) -> int:
+    """Convert a single map with the given command line options. Returns the exit code."""
+    print(f"Parsing {i3d_path}...")
+
+    try:
+        if args.list_nodes:
+            # Just list top-level nodes
+            scene_children = list_scene_children(i3d_path)
+            if scene_children is not None:
+                print("\nTop-level nodes in Scene:")
+                for name, node_type in scene_children:
+                    print(f"  {name} ({node_type})")
+            return 0
 
-    # Find trees
-    trees = extractor.find_trees(parent_name=args.tree_parent)
+        # Without a node named like the tree parent there is nothing to extract,
+        # and a raw byte search can rule that out before the file is parsed
+        parent_names = parse_parent_names(args.tree_parent)
+        if parent_names and not _quick_has_tree_parent(i3d_path, parent_names):
+            trees = []
+        else:
+            # The document tree is only kept when it has to be rewritten; otherwise find_trees() streams the file
+            extractor = I3DTreeExtractor(i3d_path, streaming=args.streaming, keep_tree=args.remove_from_i3d)
+
+            # Pass tree type loader to extractor if loaded
+            if loader:
+                extractor.tree_type_loader = loader
+
+            # Find trees
+            trees = extractor.find_trees(parent_name=args.tree_parent)
+    except ET.ParseError as e:
+        # libxml2 refuses documents nested deeper than 2048 levels, even with huge_tree
+        if not LXML_AVAILABLE or 'Excessive depth' not in str(e):
+            raise
+        print(f"Error: {i3d_path} is nested too deeply for lxml: {e}")
+        print("  Uninstall lxml to parse it with Python's built-in XML parser, which has no depth limit")
+        return 1
 
     if not trees:
         print("No trees found!")
@@ -866,43 +1419,106 @@ Examples:
         return 1
 
     # Pass loader to print_summary if we have tree types loaded
-    print_summary(trees, loader if tree_types_loaded else None)
+    print_summary(trees, loader)
 
     if args.preview:
         print("\n[Preview mode - no files modified]")
         return 0
 
     # Generate treePlant.xml
-    if args.output:
-        generate_treeplant_xml(trees, args.output, loader if tree_types_loaded else None)
-        print(f"\nGenerated: {args.output}")
+    if output_path:
+        generate_treeplant_xml(trees, output_path, loader)
+        print(f"\nGenerated: {output_path}")
 
     # Remove from i3d if requested
     if args.remove_from_i3d:
-        if not args.output:
+        if not output_path:
             print("Error: --remove-from-i3d requires --output")
             return 1
 
         # Create backup
-        backup_path = args.i3d.with_suffix('.i3d.backup')
+        backup_path = i3d_path.with_suffix('.i3d.backup')
         if not backup_path.exists():
-            shutil.copy2(args.i3d, backup_path)
+            create_backup(i3d_path, backup_path)
             print(f"Created backup: {backup_path}")
         else:
             # Create timestamped backup
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            backup_path = args.i3d.with_suffix(f'.i3d.backup_{timestamp}')
-            shutil.copy2(args.i3d, backup_path)
+            timestamp = time.strftime('%Y%m%d_%H%M%S')
+            backup_path = i3d_path.with_suffix(f'.i3d.backup_{timestamp}')
+            create_backup(i3d_path, backup_path)
             print(f"Created backup: {backup_path}")
 
         # Remove trees
         removed = extractor.remove_trees()
-        extractor.save(args.i3d)
-        print(f"Removed {removed} tree nodes from {args.i3d}")
+        extractor.save(i3d_path)
+        print(f"Removed {removed} tree nodes from {i3d_path}")
 
     print("\nDone!")
     return 0
 
 
+# Per-process state of batch workers, set up once by _init_batch_worker
+_batch_args: Optional[argparse.Namespace] = None
+_batch_loader: Optional[TreeTypeLoader] = None
+
+
+def _init_batch_worker(args: argparse.Namespace, loader: Optional[TreeTypeLoader]):
+    """Store the options and the already loaded tree types in a batch worker."""
+    global _batch_args, _batch_loader
+    _batch_args = args
+    _batch_loader = loader
+
+
+def _convert_batch_item(i3d_path: Path) -> Tuple[int, str]:
+    """Convert one map of a batch. Returns the exit code and the captured console output."""
+    output_path = None
+    if _batch_args.output:
+        output_path = _batch_args.output / f'{i3d_path.stem}_treePlant.xml'
+
+    # Capture the output so the reports of maps converted in parallel don't interleave
+    output = io.StringIO()
+    with redirect_stdout(output):
+        try:
+            rc = convert_i3d(i3d_path, _batch_args, output_path, _batch_loader)
+        except Exception as e:
+            print(f"Error: {e}")
+            rc = 1
+    return rc, output.getvalue()
+
+
+def convert_batch(args: argparse.Namespace, loader: Optional[TreeTypeLoader]) -> int:
+    """Convert every .i3d file in the batch folder, several maps at a time."""
+    paths = sorted(args.batch.glob('*.i3d'))
+    if not paths:
+        print(f"No .i3d files found in {args.batch}")
+        return 1
+
+    if args.output:
+        try:
+            args.output.mkdir(parents=True, exist_ok=True)
+        except OSError as e:
+            print(f"Error: Cannot create output folder {args.output}: {e}")
+            return 1
+
+    jobs = min(args.jobs or os.cpu_count() or 1, len(paths))
+    if sys.platform == 'win32':
+        jobs = min(jobs, 61)  # ProcessPoolExecutor's limit on Windows
+    print(f"Converting {len(paths)} maps with {jobs} jobs...")
+
+    # Workers get the loaded tree types once instead of re-reading treeTypes.xml per map
+    failed = 0
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_batch_worker,
+                             initargs=(args, loader)) as executor:
+        chunksize = max(1, len(paths) // (4 * jobs))
+        for i3d_path, (rc, output) in zip(paths, executor.map(_convert_batch_item, paths, chunksize=chunksize)):
+            print(f"\n=== {i3d_path} ===")
+            print(output, end='')
+            if rc != 0:
+                failed += 1
+
+    print(f"\nConverted {len(paths) - failed} of {len(paths)} maps")
+    return 1 if failed else 0
+
+
 if __name__ == '__main__':
     exit(main())